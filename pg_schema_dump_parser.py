@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 
 import os
+import atexit
 import logging
 import re
 import argparse
 import subprocess
 import configparser
 import shutil
+from collections import OrderedDict
 from datetime import datetime, timezone
 from time import time
+from typing import BinaryIO, TextIO
+
+import psycopg
 
 
 APPLICATION_NAME = 'pg_schema_dump_parser'
@@ -16,26 +21,36 @@ warnings = False
 logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', encoding='utf-8', level=logging.INFO, datefmt="%Y-%m-%d %H:%M:%S")
 logger = logging.getLogger(APPLICATION_NAME)
 
-
-def generate_metadata(directory: str, elapsed_time: str, warnings: bool) -> str:
+# compiled once, these are matched against every segment of the dump
+# identifiers are plain or double quoted, pg_dump quotes any with upper case or special characters
+_IDENT = r'(?:"(?:[^"]|"")+"|[\w$]+)'
+# objects are named right after their leading keywords, triggers and rules after ON or TO
+_HEAD_NAME_RE = re.compile(rf"(?:[A-Z]+\s+)+({_IDENT})\.({_IDENT})")
+_TARGET_NAME_RE = re.compile(rf"\s(?:ON|TO)\s+(?:ONLY\s+)?({_IDENT})\.({_IDENT})")
+_NAME_RE = re.compile(rf"\s({_IDENT})\.({_IDENT})")
+_INDEX_RE = re.compile(rf"CREATE (?:UNIQUE )?INDEX ({_IDENT}) ON (?:ONLY )?({_IDENT})\.{_IDENT}")
+_EXTENSION_RE = re.compile(rf"CREATE EXTENSION (?:IF NOT EXISTS )?({_IDENT}) WITH SCHEMA ({_IDENT})")
+# acls and comments name their object ahead of the grantee or the comment text
+_HEAD_END_RE = re.compile(r" (?:IS|TO|FROM) ")
+_VERSION_RE = re.compile(r"([0-9]*[.]?[0-9]+)")
+
+# schema files kept open across writes, least recently used first, and directories already created
+_MAX_OPEN_FILES = 512
+_OPEN_FILES: OrderedDict[str, TextIO] = OrderedDict()
+_DIRS_MADE: set[str] = set()
+# schema files created in this run
+_TOUCHED: set[str] = set()
+# functions and procedures found in the dump, as (object_type, schema, name, append)
+_FUNCTIONS: list[tuple[str, str, str, bool]] = []
+
+
+def generate_metadata(directory: str, elapsed_time: str, warnings: bool, cursor: psycopg.Cursor) -> str:
     """ Generates metadata """
 
     host = config.get('postgresql', 'host')
-    port = config.get('postgresql', 'port')
     dbname = config.get('postgresql', 'db')
-    user = config.get('postgresql', 'user')
-    password = config.get('postgresql', 'password')
-
-    database_version = subprocess.Popen(
-        ['psql',
-        f"--dbname=postgresql://{user}:{password}@{host}:{port}/{dbname}?application_name={APPLICATION_NAME}",
-         "-A",
-         "--no-align",
-         "--no-psqlrc",
-         "--tuples-only",
-         f"-c SELECT setting FROM pg_catalog.pg_settings WHERE name = 'server_version'"],
-        stdout=subprocess.PIPE
-    )  # pylint: disable=R1732
+
+    cursor.execute("SELECT setting FROM pg_catalog.pg_settings WHERE name = 'server_version'")
 
     pg_dump_version = subprocess.Popen(
         ['pg_dump',
@@ -47,8 +62,8 @@ def generate_metadata(directory: str, elapsed_time: str, warnings: bool) -> str:
     database_name = f"database_name: {dbname}"
     database_host = f"database_host: {host}"
     file_name = f"{directory}/schema/METADATA"
-    database_version = f"database_version: {database_version.communicate()[0].decode('utf-8').strip()}"
-    pg_dump_version = re.search(r"([0-9]*[.]?[0-9]+)", pg_dump_version.communicate()[0].decode('utf-8').strip()).group(1)
+    database_version = f"database_version: {cursor.fetchone()[0]}"
+    pg_dump_version = _VERSION_RE.search(pg_dump_version.communicate()[0].decode('utf-8').strip()).group(1)
     pg_dump_version = f"pg_dump_version: {pg_dump_version}"
 
     if not os.path.exists(file_name):
@@ -61,25 +76,24 @@ def generate_metadata(directory: str, elapsed_time: str, warnings: bool) -> str:
             file.write(f"warnings: {warnings}" + '\n')
 
 
-def read_in_chunk(stream: str, separator: str) -> str:
-    """ Read in chunk https://stackoverflow.com/questions/47927039/reading-a-file-until-a-specific-character-in-python """
-    buffer = ''
-    while True:  # until EOF
-        chunk = stream.readline(4096)  # 4096
-        if not chunk:  # EOF?
-            yield buffer
-            break
-        buffer += chunk
-        while True:  # until no separator is found
-            try:
-                part, buffer = buffer.split(separator, 1)
-            except ValueError:
-                break
-            else:
-                yield part
-
-
-def pg_schema_dump(host: str, dbname: str, port: str, user: str, password: str) -> str:
+def read_in_chunk(stream: BinaryIO, separator: bytes) -> bytes:
+    """ Read in chunk https://stackoverflow.com/questions/47927039/reading-a-file-until-a-specific-character-in-python
+    SQL comments, SET statements and blank lines are skipped """
+    parts = []
+    for line in stream:  # until EOF
+        # clean up SET and SQL comments
+        if line[:2] == b'--' or line[:3] == b'SET' or not line.strip():
+            continue
+        parts.append(line)
+        # only join the buffered lines once a separator shows up, lines are whole so it cannot span two of them
+        if separator in line:
+            *segments, remainder = b''.join(parts).split(separator)
+            yield from segments
+            parts = [remainder]
+    yield b''.join(parts)
+
+
+def pg_schema_dump(host: str, dbname: str, port: str, user: str, password: str) -> BinaryIO:
     """ Get schema dump of a postgres database """
 
     pg_dump_proc = subprocess.Popen(
@@ -90,93 +104,146 @@ def pg_schema_dump(host: str, dbname: str, port: str, user: str, password: str)
          ],
         stdout=subprocess.PIPE
     )  # pylint: disable=R1732
-    # clean up SET and SQL comments
-    modified_dump = subprocess.Popen(['sed', '/^--/d;/^\\s*$/d;/^SET/d'], text=True, stdin=pg_dump_proc.stdout, stdout=subprocess.PIPE)  # pylint: disable=R1732
-    return modified_dump.stdout
+    return pg_dump_proc.stdout
+
+
+def open_schema_file(file_name: str, append: bool) -> TextIO:
+    """ Returns a cached handle of a schema file, truncated unless appending """
+
+    file = _OPEN_FILES.get(file_name)
+    if file is None:
+        if len(_OPEN_FILES) >= _MAX_OPEN_FILES:
+            _OPEN_FILES.popitem(last=False)[1].close()
+        # the schema directory starts out empty, so a file is created on its first open of the run
+        # and only appended to when reopened after an eviction
+        mode = 'a' if append and file_name in _TOUCHED else 'w'
+        _TOUCHED.add(file_name)
+        file = _OPEN_FILES[file_name] = open(file_name, mode, encoding='utf-8', buffering=65536)  # pylint: disable=R1732
+    else:
+        _OPEN_FILES.move_to_end(file_name)
+        if not append:
+            file.seek(0)
+            file.truncate()
+    return file
+
+
+def close_schema_files() -> None:
+    """ Closes the schema files kept open """
+
+    while _OPEN_FILES:
+        _OPEN_FILES.popitem()[1].close()
+
+
+atexit.register(close_schema_files)
+
+
+def unquote(identifier: str) -> str:
+    """ Strips the double quotes of a quoted identifier """
+
+    if identifier.startswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+
+def path_component(identifier: str) -> str:
+    """ Unquotes an identifier and escapes it into a single file name, so it cannot leave its directory """
+
+    name = unquote(identifier).replace('%', '%25').replace('/', '%2F')
+    if name in ('.', '..'):
+        name = name.replace('.', '%2E')
+    return name
 
 
 def parse_schema(directory: str, object_type: str, schema: str, object_name: str, definition: str, append: bool) -> None:
     """ Writes or appends to schema file """
 
-    dir_path = f"{directory}/schema/{object_type}/{schema}"
+    dir_path = f"{directory}/schema/{object_type}/{path_component(schema)}"
 
-    if not os.path.exists(dir_path):
-        os.makedirs(dir_path)
+    if dir_path not in _DIRS_MADE:
+        os.makedirs(dir_path, exist_ok=True)
+        _DIRS_MADE.add(dir_path)
 
-    file_name = f"{dir_path}/{object_name}.sql"
+    file_name = f"{dir_path}/{path_component(object_name)}.sql"
 
-    if append:
-        if not os.path.exists(file_name):
-            with open(file_name, 'a', encoding='utf-8') as file:
-                file.write(definition)
-        else:
-            with open(file_name, 'r+', encoding='utf-8') as file:
-                current_content = [e+';\n' for e in read_in_chunk(file, ';\n') if e]
-                line_found = any(definition in line for line in current_content)
-                # if definition does not exist, append it to the schema file
-                if not line_found:
-                    file.seek(0, os.SEEK_END)
-                    file.write(definition)
-    else:
-        with open(file_name, 'w', encoding='utf-8') as file:
-            file.write(definition)
+    # every statement appears once in a dump and the schema directory starts out empty,
+    # so appended definitions need no deduplication
+    open_schema_file(file_name, append).write(definition)
 
 
 def parse_object(stream: str, object_type: str, append: bool = True) -> None:
     """ Parses tables, views, materialized views, sequences, types, aggregates, defaults, constraints, rules,
     triggers, clustered indexes, comments, extensions, foreign tables, partitions """
 
-    schema_name = re.match(r"^(CREATE.*TABLE|COMMENT ON \w+|CREATE AGGREGATE|CREATE.*VIEW|CREATE TYPE|CREATE DOMAIN|CREATE SEQUENCE|ALTER.*TABLE \w+|ALTER.*TABLE|GRANT.*ON \w+|REVOKE.*ON \w+|.*TRIGGER.*?ON|.*RULE.*\n.*?ON.*) (\w+).(\w+)", stream, re.I).group(2)
-    object_name = re.match(r"^(CREATE.*TABLE|COMMENT ON \w+|CREATE AGGREGATE|CREATE.*VIEW|CREATE TYPE|CREATE DOMAIN|CREATE SEQUENCE|ALTER.*TABLE \w+|ALTER.*TABLE|GRANT.*ON \w+|REVOKE.*ON \w+|.*TRIGGER.*?ON|.*RULE.*\n.*?ON.*) (\w+).(\w+)", stream, re.I).group(3)
-    parse_schema(args.directory, object_type, schema_name, object_name, stream, append)
+    match = _HEAD_NAME_RE.match(stream) or _TARGET_NAME_RE.search(stream)
+    if match:
+        parse_schema(args.directory, object_type, match.group(1), match.group(2), stream, append)
+    else:
+        parse_utility(stream, object_type, append)
 
 
 def parse_indexes(stream: str, object_type: str, append: bool = False) -> None:
     """ Parses indexes """
-    index_name = re.match(r"^CREATE .*INDEX (\w+) ON (\w+).(\w+)", stream, re.I).group(1)
-    schema_name = re.match(r"^CREATE .*INDEX (\w+) ON (\w+).(\w+)", stream, re.I).group(2)
-    parse_schema(args.directory, object_type, schema_name, index_name, stream, append)
+    match = _INDEX_RE.match(stream)
+    if match:
+        parse_schema(args.directory, object_type, match.group(2), match.group(1), stream, append)
+    else:
+        parse_utility(stream, object_type, append)
 
 
 def parse_extensions(stream: str, object_type: str, append: bool = False) -> None:
     """ Parses extensions """
-    extension_name = re.match(r"^CREATE EXTENSION.* (\w+) WITH SCHEMA (\w+)", stream, re.I).group(1)
-    schema_name = re.match(r"^CREATE EXTENSION.* (\w+) WITH SCHEMA (\w+)", stream, re.I).group(2)
-    parse_schema(args.directory, object_type, schema_name, extension_name, stream, append)
+    match = _EXTENSION_RE.match(stream)
+    if match:
+        parse_schema(args.directory, object_type, match.group(2), match.group(1), stream, append)
+    else:
+        parse_utility(stream, object_type, append)
 
 
 def parse_function(stream: str, object_type: str, append: bool = False) -> None:
-    """ Parses function and procedure definition """
+    """ Parses function and procedure definition, the definitions are fetched by parse_functions """
 
     # see https://www.geeksforgeeks.org/postgresql-dollar-quoted-string-constants/
     # because PG functions' bodies can be written as dollar quotes and single quotes
     # we rely solely on pg_get_functiondef for parsing functions
 
-    host = config.get('postgresql', 'host')
-    port = config.get('postgresql', 'port')
-    dbname = config.get('postgresql', 'db')
-    user = config.get('postgresql', 'user')
-    password = config.get('postgresql', 'password')
-
-    schema_name = re.match(r"^(CREATE FUNCTION|CREATE OR REPLACE FUNCTION|CREATE PROCEDURE|CREATE OR REPLACE PROCEDURE) (\w+).(\w+)", stream, re.I).group(2)
-    func_name = re.match(r"^(CREATE FUNCTION|CREATE OR REPLACE FUNCTION|CREATE PROCEDURE|CREATE OR REPLACE PROCEDURE) (\w+).(\w+)", stream, re.I).group(3)
-
-    with subprocess.Popen(
-        ['psql',
-         f"--dbname=postgresql://{user}:{password}@{host}:{port}/{dbname}?application_name={APPLICATION_NAME}",
-         "-A",
-         "--no-align",
-         "--no-psqlrc",
-         "--tuples-only",
-         f"-c SELECT pg_catalog.string_agg(pg_catalog.pg_get_functiondef(f.oid), E';\n') || ';' AS def FROM (SELECT oid \
-             FROM pg_catalog.pg_proc WHERE proname = '{func_name}' AND pronamespace = '{schema_name}'::regnamespace) AS f"],
-        stdout=subprocess.PIPE
-         ) as func_def_proc:
-
-        func_def = func_def_proc.communicate()[0].decode('utf-8').strip()
-
+    match = _HEAD_NAME_RE.match(stream)
+    if match:
+        _FUNCTIONS.append((object_type, match.group(1), match.group(2), append))
+    else:
+        parse_utility(stream, object_type, append)
+
+
+def parse_functions(cursor: psycopg.Cursor) -> bool:
+    """ Fetches the definitions of all parsed functions and procedures in a single query and writes them,
+    returns False if any definition was not found """
+
+    if not _FUNCTIONS:
+        return True
+
+    targets = list(dict.fromkeys(_FUNCTIONS))
+    names = list(dict.fromkeys((unquote(schema_name), unquote(func_name)) for _, schema_name, func_name, _ in targets))
+
+    # definitions of overloaded functions are aggregated into one
+    cursor.execute(
+        "SELECT n.nspname, p.proname, pg_catalog.string_agg(pg_catalog.pg_get_functiondef(p.oid), E';\\n') || ';' AS def \
+            FROM pg_catalog.pg_proc p JOIN pg_catalog.pg_namespace n ON n.oid = p.pronamespace \
+            WHERE (n.nspname, p.proname) IN (SELECT * FROM pg_catalog.unnest(%s::name[], %s::name[])) GROUP BY n.nspname, p.proname",
+        ([schema_name for schema_name, _ in names], [func_name for _, func_name in names])
+    )
+    func_defs = {(schema_name, func_name): func_def.strip() for schema_name, func_name, func_def in cursor.fetchall()}
+
+    complete = True
+    for object_type, schema_name, func_name, append in targets:
+        func_def = func_defs.get((unquote(schema_name), unquote(func_name)))
+        if func_def is None:
+            logger.warning("Definition of %s.%s not found, it may have been dropped during the dump", schema_name, func_name)
+            complete = False
+            continue
         parse_schema(args.directory, object_type, schema_name, func_name, func_def + '\n', append)
 
+    _FUNCTIONS.clear()
+    return complete
+
 
 def parse_utility(stream: str, utility_type: str, append: bool = True) -> None:
     """ Parses utilitities such as triggers, ownerships, acls, comments, mappings, schemas, rules, events, servers """
@@ -184,6 +251,114 @@ def parse_utility(stream: str, utility_type: str, append: bool = True) -> None:
     parse_schema(args.directory, 'utilities', 'others', utility_type, stream, append)
 
 
+def parse_object_or_utility(stream: str, object_type: str, append: bool = True) -> None:
+    """ Parses acls and comments, schema-qualified ones as objects and the rest as utilities """
+
+    head = _HEAD_END_RE.search(stream)
+    match = _NAME_RE.search(stream, 0, head.start() if head else len(stream))
+    if match:
+        parse_schema(args.directory, object_type, match.group(1), match.group(2), stream, append)
+    else:
+        parse_utility(stream, object_type, append)
+
+
+# Segments are routed on their first two keywords, falling back to the first keyword alone.
+# Each rule is (prefix, markers, parser, object_type); the first rule whose prefix the segment
+# starts with and, when markers are given, which contains any of the markers wins.
+_ALTER_TABLE = (b"ALTER TABLE", b"ALTER FOREIGN TABLE")
+_OWNERSHIP_RULE = (b"", (b"OWNER TO", b"OWNED BY"), parse_utility, 'ownerships')
+_ACL_RULE = (b"", (b"GRANT", b"REVOKE"), parse_object_or_utility, 'acls')
+_DEFAULT_RULES = (_OWNERSHIP_RULE, _ACL_RULE)
+_ALTER_TABLE_RULES = (
+    (_ALTER_TABLE, (b"ALTER COLUMN",), parse_object, 'columns_mod'),
+    (_ALTER_TABLE, (b"CLUSTER ON",), parse_object, 'clustered_indexes'),
+    (_ALTER_TABLE, (b"ADD CONSTRAINT",), parse_object, 'constraints'),
+    (_ALTER_TABLE, (b"SET DEFAULT",), parse_object, 'defaults'),
+    (_ALTER_TABLE, (b"ATTACH PARTITION", b"INHERIT"), parse_object, 'partitions'),
+    (b"", (b"DISABLE TRIGGER", b"ENABLE TRIGGER", b"ENABLE ALWAYS TRIGGER", b"ENABLE REPLICA TRIGGER"), parse_object, 'triggers'),
+    (b"", (b"DISABLE RULE", b"ENABLE RULE", b"ENABLE ALWAYS RULE", b"ENABLE REPLICA RULE"), parse_object, 'rules'),
+    _OWNERSHIP_RULE,
+    _ACL_RULE,
+    (_ALTER_TABLE, (b"ADD GENERATED ALWAYS AS IDENTITY",), parse_object, 'identities'),
+    (_ALTER_TABLE, (b"ROW LEVEL SECURITY",), parse_object, 'row_level_securities'),
+    (_ALTER_TABLE, (b"REPLICA IDENTITY",), parse_object, 'replica_identities'),
+)
+DISPATCH = {
+    b"CREATE TABLE": ((b"", (), parse_object, 'tables'),),
+    b"CREATE UNLOGGED": ((b"CREATE UNLOGGED TABLE", (), parse_object, 'tables'),),
+    b"CREATE FOREIGN": ((b"CREATE FOREIGN TABLE", (), parse_object, 'tables'),),
+    b"CREATE INDEX": ((b"", (), parse_indexes, 'indexes'),),
+    b"CREATE UNIQUE": ((b"CREATE UNIQUE INDEX", (), parse_indexes, 'indexes'),),
+    b"CREATE VIEW": ((b"", (), parse_object, 'views'),),
+    b"CREATE MATERIALIZED": ((b"CREATE MATERIALIZED VIEW", (), parse_object, 'views'),),
+    b"CREATE AGGREGATE": ((b"", (), parse_object, 'aggregates'),),
+    b"CREATE FUNCTION": ((b"", (), parse_function, 'functions'),),
+    b"CREATE PROCEDURE": ((b"", (), parse_function, 'procedures'),),
+    b"CREATE TYPE": ((b"", (), parse_object, 'types'),),
+    b"CREATE DOMAIN": ((b"", (), parse_object, 'domains'),),
+    b"CREATE SEQUENCE": ((b"", (), parse_object, 'sequences'),),
+    b"CREATE TRIGGER": ((b"", (), parse_object, 'triggers'),),
+    b"CREATE CONSTRAINT": ((b"CREATE CONSTRAINT TRIGGER", (), parse_object, 'triggers'),),
+    b"CREATE RULE": ((b"", (), parse_object, 'rules'),),
+    b"CREATE OR": (
+        (b"CREATE OR REPLACE VIEW", (), parse_object, 'views'),
+        (b"CREATE OR REPLACE FUNCTION", (), parse_function, 'functions'),
+        (b"CREATE OR REPLACE PROCEDURE", (), parse_function, 'procedures'),
+        ((b"CREATE OR REPLACE TRIGGER", b"CREATE OR REPLACE CONSTRAINT TRIGGER"), (), parse_object, 'triggers'),
+        (b"CREATE OR REPLACE RULE", (), parse_object, 'rules'),
+    ),
+    b"CREATE SCHEMA": ((b"", (), parse_utility, 'schemas'),),
+    b"CREATE EXTENSION": ((b"", (), parse_extensions, 'extensions'),),
+    b"CREATE SERVER": ((b"", (), parse_utility, 'servers'),),
+    b"CREATE EVENT": ((b"CREATE EVENT TRIGGER", (), parse_utility, 'events'),),
+    b"CREATE USER": ((b"CREATE USER MAPPING", (), parse_utility, 'mappings'),),
+    b"CREATE PUBLICATION": ((b"", (), parse_utility, 'publications'),),
+    b"CREATE SUBSCRIPTION": ((b"", (), parse_utility, 'subscriptions'),),
+    b"ALTER TABLE": _ALTER_TABLE_RULES,
+    b"ALTER FOREIGN": _ALTER_TABLE_RULES,
+    b"ALTER TRIGGER": ((b"", (), parse_object, 'triggers'),),
+    b"ALTER RULE": ((b"", (), parse_object, 'rules'),),
+    b"ALTER EVENT": (_OWNERSHIP_RULE, (b"ALTER EVENT TRIGGER", (), parse_utility, 'events')),
+    b"ALTER PUBLICATION": (_OWNERSHIP_RULE, (b"", (), parse_utility, 'publications')),
+    b"ALTER SUBSCRIPTION": (_OWNERSHIP_RULE, (b"", (), parse_utility, 'subscriptions')),
+    b"GRANT": ((b"", (), parse_object_or_utility, 'acls'),),
+    b"REVOKE": ((b"", (), parse_object_or_utility, 'acls'),),
+    b"COMMENT ON": ((b"", (), parse_object_or_utility, 'comments'),),
+}
+
+
+# all markers of the rules above, so that a segment is scanned for them only once;
+# the markers do not overlap one another, which lets findall report every one present
+_MARKERS_RE = re.compile(b'|'.join(sorted({re.escape(marker) for rules in (*DISPATCH.values(), _DEFAULT_RULES)
+                                           for _, markers, _, _ in rules for marker in markers}, key=len, reverse=True)))
+
+# keys whose only rule is unconditional are resolved ahead of time, so most segments are routed by one lookup
+_ROUTES = {key: rules[0][2:] for key, rules in DISPATCH.items() if len(rules) == 1 and not rules[0][0] and not rules[0][1]}
+
+
+def dispatch(segment: bytes) -> tuple:
+    """ Returns the parser and object type of a raw segment, (None, None) if there is none """
+
+    keywords = segment[:40].split(b' ', 2)
+    key = b' '.join(keywords[:2])
+    # the first keyword alone only routes segments whose first two keywords have no entry, such as acls
+    route = _ROUTES.get(key) if key in DISPATCH else _ROUTES.get(keywords[0])
+    if route:
+        return route
+    rules = DISPATCH.get(key) or DISPATCH.get(keywords[0], _DEFAULT_RULES)
+    found = None
+    for prefix, markers, parser, object_type in rules:
+        if not segment.startswith(prefix):
+            continue
+        if markers:
+            if found is None:
+                found = set(_MARKERS_RE.findall(segment))
+            if found.isdisjoint(markers):
+                continue
+        return parser, object_type
+    return None, None
+
+
 #  TODO: in a case a table depends on a user-defined function, we can simply add a dummy function before the create table
 
 
@@ -206,97 +381,43 @@ if __name__ == "__main__":
     postgres_user = config.get('postgresql', 'user')
     postgres_password = config.get('postgresql', 'password')
 
-    # clean up previous parse if it exists
-    if os.path.exists(f"{args.directory}/schema"):
-        shutil.rmtree(f"{args.directory}/schema")
-
-    start_time = time()
-
-    with pg_schema_dump(postgres_host, postgres_db, postgres_port, postgres_user, postgres_password) as f:
-        logger.info(f"Started parser: {APPLICATION_NAME}")
-        for segment in read_in_chunk(f, separator=';\n'):
-            if segment:
-                segment = segment + ';\n'
-
-            if segment.startswith(("CREATE TABLE", "CREATE UNLOGGED TABLE", "CREATE FOREIGN TABLE")):
-                parse_object(segment, 'tables')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and "ALTER COLUMN" in segment:
-                parse_object(segment, 'columns_mod')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and "CLUSTER ON" in segment:
-                parse_object(segment, 'clustered_indexes')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and "ADD CONSTRAINT" in segment:
-                parse_object(segment, 'constraints')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and "SET DEFAULT" in segment:
-                parse_object(segment, 'defaults')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and ("ATTACH PARTITION" in segment or "INHERIT" in segment):
-                parse_object(segment, 'partitions')
-            elif segment.startswith(("CREATE INDEX", "CREATE UNIQUE INDEX")):
-                parse_indexes(segment, 'indexes')
-            elif segment.startswith(("CREATE VIEW", "CREATE OR REPLACE VIEW", "CREATE MATERIALIZED VIEW")):
-                parse_object(segment, 'views')
-            elif segment.startswith("CREATE AGGREGATE"):
-                parse_object(segment, 'aggregates')
-            elif segment.startswith(("CREATE FUNCTION", "CREATE OR REPLACE FUNCTION")):
-                parse_function(segment, 'functions')
-            elif segment.startswith(("CREATE PROCEDURE", "CREATE OR REPLACE PROCEDURE")):
-                parse_function(segment, 'procedures')
-            elif segment.startswith("CREATE TYPE"):
-                parse_object(segment, 'types')
-            elif segment.startswith("CREATE DOMAIN"):
-                parse_object(segment, 'domains')
-            elif segment.startswith("CREATE SEQUENCE"):
-                parse_object(segment, 'sequences')
-            elif segment.startswith(("CREATE TRIGGER", "CREATE OR REPLACE TRIGGER", "CREATE CONSTRAINT TRIGGER", "CREATE OR REPLACE CONSTRAINT TRIGGER", "ALTER TRIGGER")) or "DISABLE TRIGGER" in segment or re.search(r"ENABLE.*TRIGGER", segment):
-                parse_object(segment, 'triggers')
-            elif segment.startswith(("CREATE RULE", "CREATE OR REPLACE RULE", "ALTER RULE")) or "DISABLE RULE" in segment or re.search(r"ENABLE.*RULE", segment):
-                parse_object(segment, 'rules')
-            elif segment.startswith("CREATE SCHEMA"):
-                parse_utility(segment, 'schemas')
-            elif ("OWNER TO" in segment or "OWNED BY" in segment):
-                parse_utility(segment, 'ownerships')
-            elif ("GRANT" in segment or "REVOKE" in segment) and re.search(r"\w+\.\w+", segment):
-                parse_object(segment, 'acls')
-            elif ("GRANT" in segment or "REVOKE" in segment) and not re.search(r"\w+\.\w+", segment):
-                parse_utility(segment, 'acls')
-            elif segment.startswith("CREATE EXTENSION"):
-                parse_extensions(segment, 'extensions')
-            elif segment.startswith("CREATE SERVER"):
-                parse_utility(segment, 'servers')
-            elif segment.startswith("COMMENT") and re.search(r"\w+\.\w+", segment):
-                parse_object(segment, 'comments')
-            elif segment.startswith("COMMENT") and not re.search(r"\w+\.\w+", segment):
-                parse_utility(segment, 'comments')
-            elif segment.startswith(("CREATE EVENT TRIGGER", "ALTER EVENT TRIGGER")):
-                parse_utility(segment, 'events')
-            elif segment.startswith("CREATE USER MAPPING"):
-                parse_utility(segment, 'mappings')
-            elif segment.startswith("CREATE PUBLICATION"):
-                parse_utility(segment, 'publications')
-            elif segment.startswith("ALTER PUBLICATION") and "OWNER TO" not in segment:
-                parse_utility(segment, 'publications')
-            elif segment.startswith("CREATE SUBSCRIPTION"):
-                parse_utility(segment, 'subscriptions')
-            elif segment.startswith("ALTER SUBSCRIPTION") and "OWNER TO" not in segment:
-                parse_utility(segment, 'subscriptions')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and "ADD GENERATED ALWAYS AS IDENTITY" in segment:
-                parse_object(segment, 'identities')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and re.search(r".*ROW LEVEL SECURITY", segment):
-                parse_object(segment, 'row_level_securities')
-            elif segment.startswith(("ALTER TABLE", "ALTER FOREIGN TABLE")) and re.search(r"REPLICA IDENTITY", segment):
-                parse_object(segment, 'replica_identities')
-            elif segment.startswith(("CREATE", "ALTER")):
-                # if there are segments not parsed by us, we simply raise a warning to inform the caller of such
-                # printing the segment
-                # if you notice this, kindly create an issue on https://github.com/bolajiwahab/pg_schema_dump_parser with
-                # the segment sample
-                logger.warning("Parsing of %s not yet implemented, kindly create an issue on https://github.com/bolajiwahab/pg_schema_dump_parser", segment)
-                warnings = True
-
-    elapsed_time = f"{(time() - start_time):.2f} seconds"
-
-    if warnings:
-        generate_metadata(args.directory, elapsed_time, warnings)
-        logger.info("Schema parsing completed with warnings in %s", elapsed_time)
-    else:
-        generate_metadata(args.directory, elapsed_time, warnings)
-        logger.info("Schema parsing completed with no errors in %s", elapsed_time)
+    with psycopg.connect(host=postgres_host, port=postgres_port, dbname=postgres_db, user=postgres_user,
+                         password=postgres_password, application_name=APPLICATION_NAME, autocommit=True) as connection:
+        cursor = connection.cursor()
+
+        # clean up previous parse if it exists
+        if os.path.exists(f"{args.directory}/schema"):
+            shutil.rmtree(f"{args.directory}/schema")
+
+        start_time = time()
+
+        with pg_schema_dump(postgres_host, postgres_db, postgres_port, postgres_user, postgres_password) as f:
+            logger.info(f"Started parser: {APPLICATION_NAME}")
+            for segment in read_in_chunk(f, separator=b';\n'):
+                if segment:
+                    segment = segment + b';\n'
+
+                # segments are dispatched as raw bytes and only decoded once they are parsed
+                parser, object_type = dispatch(segment)
+
+                if parser:
+                    parser(segment.decode('utf-8'), object_type)
+                elif segment.startswith((b"CREATE", b"ALTER")):
+                    # if there are segments not parsed by us, we simply raise a warning to inform the caller of such
+                    # printing the segment
+                    # if you notice this, kindly create an issue on https://github.com/bolajiwahab/pg_schema_dump_parser with
+                    # the segment sample
+                    logger.warning("Parsing of %s not yet implemented, kindly create an issue on https://github.com/bolajiwahab/pg_schema_dump_parser", segment.decode('utf-8'))
+                    warnings = True
+
+        if not parse_functions(cursor):
+            warnings = True
+        close_schema_files()
+        elapsed_time = f"{(time() - start_time):.2f} seconds"
+
+        if warnings:
+            generate_metadata(args.directory, elapsed_time, warnings, cursor)
+            logger.info("Schema parsing completed with warnings in %s", elapsed_time)
+        else:
+            generate_metadata(args.directory, elapsed_time, warnings, cursor)
+            logger.info("Schema parsing completed with no errors in %s", elapsed_time)